@@ -1,38 +1,34 @@
 from models import Course
+from typing import Dict
 
 class CourseMockDataService:
     def __init__(self):
-        self.courses = [
+        self.courses: Dict[int, Course] = {c.id: c for c in [
             Course(id=1, name="Introduction to Programming", code="CS101", credits=3, instructor="Dr. Smith"),
             Course(id=2, name="Data Structures", code="CS201", credits=4, instructor="Dr. Johnson"),
             Course(id=3, name="Database Systems", code="CS301", credits=3, instructor="Dr. Williams"),
-        ]
+        ]}
         self.next_id = 4
     
     def get_all_courses(self):
-        return self.courses
+        return list(self.courses.values())
     
     def get_course_by_id(self, course_id: int):
-        return next((c for c in self.courses if c.id == course_id), None)
+        return self.courses.get(course_id)
     
     def add_course(self, course_data):
-        new_course = Course(id=self.next_id, **course_data.dict())
-        self.courses.append(new_course)
+        new_course = Course(id=self.next_id, **course_data.model_dump())
+        self.courses[self.next_id] = new_course
         self.next_id += 1
         return new_course
     
     def update_course(self, course_id: int, course_data):
         course = self.get_course_by_id(course_id)
         if course:
-            update_data = course_data.dict(exclude_unset=True)
-            for key, value in update_data.items():
-                setattr(course, key, value)
-            return course
+            updated = course.model_copy(update=course_data.model_dump(exclude_unset=True))
+            self.courses[course_id] = updated
+            return updated
         return None
     
     def delete_course(self, course_id: int):
-        course = self.get_course_by_id(course_id)
-        if course:
-            self.courses.remove(course)
-            return True
-        return False
\ No newline at end of file
+        return self.courses.pop(course_id, None) is not None
\ No newline at end of file
@@ -1,11 +1,16 @@
-from fastapi import FastAPI, HTTPException, Request, Depends, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, FastAPI, HTTPException, Request, Response, Depends, status
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import httpx
 from typing import Any
 import logging
-from datetime import datetime, timedelta
+import base64
+import json
+import hashlib
+import hmac
+import time
 import jwt
+from cachetools import TTLCache
 from pydantic import BaseModel
 
 logging.basicConfig(
@@ -14,19 +19,72 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="API Gateway (Enhanced)", version="2.0.0")
+app = FastAPI(
+    title="API Gateway (Enhanced)",
+    version="2.0.0",
+    default_response_class=ORJSONResponse
+)
 
 SECRET_KEY = "your-secret-key-keep-it-secret" 
 ALGORITHM = "HS256"
+ALGORITHMS = (ALGORITHM,)
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 security = HTTPBearer()
 
+def _b64url(data: bytes) -> bytes:
+    """Base64url-encode without padding, as used in JWT segments"""
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+# HS256 signing material, built once instead of on every token issue
+_SIGNING_KEY = SECRET_KEY.encode()
+_JWT_HEADER_B64 = _b64url(
+    json.dumps({"alg": ALGORITHM, "typ": "JWT"}, separators=(",", ":"), sort_keys=True).encode()
+)
+
+# Verified token payloads keyed by SHA-256 of the raw token
+_tok_cache = TTLCache(maxsize=10000, ttl=30)
+# Recently seen expired tokens, rejected without re-decoding
+_expired_tok_cache = TTLCache(maxsize=10000, ttl=5)
+
+# Successful GET responses keyed by (service, user, path)
+_response_cache = TTLCache(maxsize=1000, ttl=10)
+# Bumped per service on every invalidation so in-flight GETs can't store stale bodies
+_cache_generation = {}
+
+# Largest request body forwarded upstream (1 MiB)
+MAX_BODY_SIZE = 1_048_576
+
+ALLOWED_METHODS = frozenset({"GET", "POST", "PUT", "DELETE"})
+
 SERVICES = {
     "student": "http://localhost:8001",
     "course": "http://localhost:8002"
 }
 
+# Derived once from SERVICES for the request path
+_SERVICE_NAMES = tuple(SERVICES.keys())
+_URL_FMT = {name: base + "{}" for name, base in SERVICES.items()}
+
+# Gateway resource names mapped to the service that owns them
+RESOURCES = {
+    "students": "student",
+    "courses": "course"
+}
+
+# Static gateway info served by the root endpoint
+_ROOT_PAYLOAD = {
+    "message": "Enhanced API Gateway is running",
+    "version": "2.0.0",
+    "features": ["Authentication", "Request Logging", "Enhanced Error Handling"],
+    "available_services": _SERVICE_NAMES,
+    "endpoints": {
+        "auth": "/auth/login",
+        "students": "/gateway/students",
+        "courses": "/gateway/courses"
+    }
+}
+
 # Models for authentication
 class LoginRequest(BaseModel):
     username: str
@@ -40,162 +98,225 @@ class Token(BaseModel):
 fake_users_db = {
     "admin": {
         "username": "admin",
-        "password": "admin123",  
+        "pw_hash": hashlib.sha256(b"admin123").hexdigest(),
         "role": "admin"
     },
     "user": {
         "username": "user",
-        "password": "user123",
+        "pw_hash": hashlib.sha256(b"user123").hexdigest(),
         "role": "user"
     }
 }
 
+# Compared against for unknown usernames so failed logins take the same path
+_DUMMY_PW_HASH = hashlib.sha256(b"").hexdigest()
+
 # JWT Authentication Functions
 def create_access_token(data: dict):
     """Create JWT access token"""
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    to_encode["exp"] = int(time.time()) + ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    signing_input = _JWT_HEADER_B64 + b"." + _b64url(
+        json.dumps(to_encode, separators=(",", ":")).encode()
+    )
+    signature = hmac.new(_SIGNING_KEY, signing_input, hashlib.sha256).digest()
+    return (signing_input + b"." + _b64url(signature)).decode()
+
+# Async so the (non-thread-safe) token caches are only used on the event loop thread
+async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Verify JWT token (successful decodes are cached briefly)"""
+    token = credentials.credentials
+    key = hashlib.sha256(token.encode()).hexdigest()
+
+    payload = _tok_cache.get(key)
+    if payload is not None:
+        if payload["exp"] > time.time():
+            return payload
+        _tok_cache.pop(key, None)
+        _expired_tok_cache[key] = True
+
+    if key in _expired_tok_cache:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has expired"
+        )
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Verify JWT token"""
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials"
-            )
+        payload = jwt.decode(
+            token,
+            SECRET_KEY,
+            algorithms=ALGORITHMS,
+            options={"require": ["exp", "sub"], "verify_exp": True}
+        )
+        _tok_cache[key] = payload
         return payload
     except jwt.ExpiredSignatureError:
+        _expired_tok_cache[key] = True
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token has expired"
         )
-    except jwt.JWTError:
+    except jwt.InvalidTokenError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials"
         )
 
+# Shared HTTP client for upstream services
+@app.on_event("startup")
+async def startup_http_client():
+    """Create a pooled HTTP client reused across all forwarded requests"""
+    app.state.http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_keepalive_connections=100,
+            max_connections=200,
+            keepalive_expiry=30.0
+        ),
+        timeout=httpx.Timeout(30.0, connect=5.0)
+    )
+
+@app.on_event("shutdown")
+async def shutdown_http_client():
+    """Close the pooled HTTP client"""
+    await app.state.http_client.aclose()
+
 # Request/Response Logging Middleware
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    """Log all incoming requests and responses"""
-    logger.info(f"Incoming request: {request.method} {request.url.path}")
-    logger.info(f"Client: {request.client.host}")
+    """Log all incoming requests and responses, rejecting oversized bodies"""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_BODY_SIZE:
+        logger.warning("Rejected %s %s: body of %s bytes", request.method, request.url.path, content_length)
+        return ORJSONResponse(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            content={
+                "detail": {
+                    "error": "Payload Too Large",
+                    "message": f"Request body exceeds the {MAX_BODY_SIZE} byte limit"
+                }
+            }
+        )
     
-    start_time = datetime.utcnow()
+    start_time = time.perf_counter()
     response = await call_next(request)
-    process_time = (datetime.utcnow() - start_time).total_seconds()
+    process_time = time.perf_counter() - start_time
     
-    logger.info(f"Response status: {response.status_code}")
-    logger.info(f"Process time: {process_time:.3f}s")
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(
+            "%s %s from %s -> %s in %.3fs",
+            request.method, request.url.path,
+            request.client.host if request.client else "-",
+            response.status_code, process_time
+        )
     
     return response
 
 # Enhanced Error Handling
-async def forward_request(service: str, path: str, method: str, **kwargs) -> Any:
+async def forward_request(request: Request, service: str, path: str, method: str, **kwargs) -> Any:
     """Forward request to the appropriate microservice with enhanced error handling"""
     if service not in SERVICES:
-        logger.error(f"Service not found: {service}")
+        logger.error("Service not found: %s", service)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail={
                 "error": "Service Not Found",
                 "message": f"The requested service '{service}' is not available",
-                "available_services": list(SERVICES.keys())
+                "available_services": _SERVICE_NAMES
             }
         )
     
-    url = f"{SERVICES[service]}{path}"
-    logger.info(f"Forwarding {method} request to: {url}")
+    if method not in ALLOWED_METHODS:
+        logger.error("Method not allowed: %s", method)
+        raise HTTPException(
+            status_code=status.HTTP_405_METHOD_NOT_ALLOWED,
+            detail={
+                "error": "Method Not Allowed",
+                "message": f"HTTP method '{method}' is not supported",
+                "allowed_methods": ["GET", "POST", "PUT", "DELETE"]
+            }
+        )
     
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        try:
-            if method == "GET":
-                response = await client.get(url, **kwargs)
-            elif method == "POST":
-                response = await client.post(url, **kwargs)
-            elif method == "PUT":
-                response = await client.put(url, **kwargs)
-            elif method == "DELETE":
-                response = await client.delete(url, **kwargs)
-            else:
-                logger.error(f"Method not allowed: {method}")
-                raise HTTPException(
-                    status_code=status.HTTP_405_METHOD_NOT_ALLOWED,
-                    detail={
-                        "error": "Method Not Allowed",
-                        "message": f"HTTP method '{method}' is not supported",
-                        "allowed_methods": ["GET", "POST", "PUT", "DELETE"]
-                    }
-                )
-            
-            # Enhanced error handling based on status code
-            if response.status_code >= 400:
-                logger.warning(f"Service returned error: {response.status_code}")
-                error_detail = {
-                    "error": "Service Error",
-                    "status_code": response.status_code,
-                    "service": service,
-                    "message": response.text
-                }
-                return JSONResponse(
-                    content=error_detail,
-                    status_code=response.status_code
-                )
-            
-            logger.info(f"Request successful: {response.status_code}")
-            return JSONResponse(
-                content=response.json() if response.text else None,
-                status_code=response.status_code
-            )
-            
-        except httpx.TimeoutException:
-            logger.error(f"Timeout connecting to service: {service}")
-            raise HTTPException(
-                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
-                detail={
-                    "error": "Gateway Timeout",
-                    "message": f"The service '{service}' took too long to respond",
-                    "service": service
-                }
-            )
-        except httpx.ConnectError:
-            logger.error(f"Connection error to service: {service}")
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail={
-                    "error": "Service Unavailable",
-                    "message": f"Unable to connect to '{service}' service. Please ensure the service is running.",
-                    "service": service,
-                    "service_url": SERVICES[service]
-                }
-            )
-        except Exception as e:
-            logger.error(f"Unexpected error: {str(e)}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail={
-                    "error": "Internal Server Error",
-                    "message": "An unexpected error occurred while processing your request",
-                    "details": str(e)
-                }
-            )
+    url = _URL_FMT[service].format(path)
+    logger.info("Forwarding %s request to: %s", method, url)
+    
+    request.state.service = service
+    response = await request.app.state.http_client.request(method, url, **kwargs)
+    
+    # Upstream bodies are passed through as-is, errors included
+    if response.status_code >= 400:
+        logger.warning("Service returned error: %s", response.status_code)
+    else:
+        logger.info("Request successful: %s", response.status_code)
+    return Response(
+        content=response.content,
+        status_code=response.status_code,
+        media_type=response.headers.get("content-type", "application/json")
+    )
+
+@app.exception_handler(httpx.TimeoutException)
+async def upstream_timeout_handler(request: Request, exc: httpx.TimeoutException):
+    """Map upstream timeouts raised by forward_request to 504"""
+    service = getattr(request.state, "service", None)
+    logger.error("Timeout connecting to service: %s", service)
+    return ORJSONResponse(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        content={
+            "detail": {
+                "error": "Gateway Timeout",
+                "message": f"The service '{service}' took too long to respond",
+                "service": service
+            }
+        }
+    )
+
+@app.exception_handler(httpx.ConnectError)
+async def upstream_connect_error_handler(request: Request, exc: httpx.ConnectError):
+    """Map upstream connection failures raised by forward_request to 503"""
+    service = getattr(request.state, "service", None)
+    logger.error("Connection error to service: %s", service)
+    return ORJSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={
+            "detail": {
+                "error": "Service Unavailable",
+                "message": f"Unable to connect to '{service}' service. Please ensure the service is running.",
+                "service": service,
+                "service_url": SERVICES.get(service)
+            }
+        }
+    )
+
+# Response Caching
+async def forward_cached(request: Request, token_data: dict, service: str, path: str) -> Any:
+    """Forward a GET request, reusing a recent successful response for the same user"""
+    key = (service, token_data["sub"], path)
+    cached = _response_cache.get(key)
+    if cached is not None:
+        content, status_code, media_type = cached
+        return Response(content=content, status_code=status_code, media_type=media_type)
+    
+    generation = _cache_generation.get(service, 0)
+    response = await forward_request(request, service, path, "GET")
+    if response.status_code < 400 and _cache_generation.get(service, 0) == generation:
+        _response_cache[key] = (response.body, response.status_code, response.media_type)
+    return response
+
+def invalidate_cache(service: str):
+    """Drop all cached responses for a service after it has been modified"""
+    _cache_generation[service] = _cache_generation.get(service, 0) + 1
+    for key in [k for k in _response_cache if k[0] == service]:
+        _response_cache.pop(key, None)
 
 # Authentication Endpoints
 @app.post("/auth/login", response_model=Token)
 async def login(login_data: LoginRequest):
     """Login endpoint to get JWT token"""
     user = fake_users_db.get(login_data.username)
+    provided = hashlib.sha256(login_data.password.encode()).hexdigest()
+    expected = user["pw_hash"] if user else _DUMMY_PW_HASH
     
-    if not user or user["password"] != login_data.password:
-        logger.warning(f"Failed login attempt for user: {login_data.username}")
+    if not hmac.compare_digest(provided, expected) or not user:
+        logger.warning("Failed login attempt for user: %s", login_data.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail={
@@ -205,83 +326,68 @@ async def login(login_data: LoginRequest):
         )
     
     access_token = create_access_token(data={"sub": user["username"], "role": user["role"]})
-    logger.info(f"Successful login for user: {login_data.username}")
+    logger.info("Successful login for user: %s", login_data.username)
     
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.get("/")
 def read_root():
     """Gateway root endpoint"""
-    return {
-        "message": "Enhanced API Gateway is running",
-        "version": "2.0.0",
-        "features": ["Authentication", "Request Logging", "Enhanced Error Handling"],
-        "available_services": list(SERVICES.keys()),
-        "endpoints": {
-            "auth": "/auth/login",
-            "students": "/gateway/students",
-            "courses": "/gateway/courses"
-        }
-    }
+    return _ROOT_PAYLOAD
+
+# Service Routes (Protected)
+router = APIRouter()
+
+async def proxy(request: Request, token_data: dict, resource: str, upstream_path: str) -> Any:
+    """Proxy a request to the microservice that owns the resource"""
+    service = RESOURCES.get(resource)
+    if service is None:
+        logger.error("Service not found: %s", resource)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={
+                "error": "Service Not Found",
+                "message": f"The requested service '{resource}' is not available",
+                "available_services": tuple(RESOURCES)
+            }
+        )
+    
+    method = request.method
+    logger.info("User %s %s %s", token_data["sub"], method, upstream_path)
+    
+    if method == "GET":
+        return await forward_cached(request, token_data, service, upstream_path)
+    
+    body = await request.body()
+    # Invalidate even if the call fails, as the upstream may have applied the write
+    try:
+        return await forward_request(
+            request, service, upstream_path, method,
+            content=body or None,
+            headers={"content-type": request.headers.get("content-type", "application/json")}
+        )
+    finally:
+        invalidate_cache(service)
+
+async def proxy_collection(resource: str, request: Request, token_data: dict = Depends(verify_token)):
+    """Proxy a collection request through gateway (requires authentication)"""
+    return await proxy(request, token_data, resource, f"/api/{resource}")
+
+async def proxy_item(resource: str, item_id: int, request: Request, token_data: dict = Depends(verify_token)):
+    """Proxy a single-item request through gateway (requires authentication)"""
+    return await proxy(request, token_data, resource, f"/api/{resource}/{item_id}")
+
+def register_proxy_routes(router: APIRouter):
+    """Register one route per method so every OpenAPI operation gets a unique id"""
+    for method in ("GET", "POST", "PUT", "DELETE"):
+        router.add_api_route(
+            "/gateway/{resource}", proxy_collection,
+            methods=[method], operation_id=f"proxy_collection_{method.lower()}"
+        )
+        router.add_api_route(
+            "/gateway/{resource}/{item_id:int}", proxy_item,
+            methods=[method], operation_id=f"proxy_item_{method.lower()}"
+        )
 
-# Student Service Routes (Protected)
-@app.get("/gateway/students")
-async def get_all_students(token_data: dict = Depends(verify_token)):
-    """Get all students through gateway (requires authentication)"""
-    logger.info(f"User {token_data['sub']} accessing students list")
-    return await forward_request("student", "/api/students", "GET")
-
-@app.get("/gateway/students/{student_id}")
-async def get_student(student_id: int, token_data: dict = Depends(verify_token)):
-    """Get a student by ID through gateway (requires authentication)"""
-    logger.info(f"User {token_data['sub']} accessing student {student_id}")
-    return await forward_request("student", f"/api/students/{student_id}", "GET")
-
-@app.post("/gateway/students")
-async def create_student(student_data: dict, token_data: dict = Depends(verify_token)):
-    """Create a new student through gateway (requires authentication)"""
-    logger.info(f"User {token_data['sub']} creating new student")
-    return await forward_request("student", "/api/students", "POST", json=student_data)
-
-@app.put("/gateway/students/{student_id}")
-async def update_student(student_id: int, student_data: dict, token_data: dict = Depends(verify_token)):
-    """Update a student through gateway (requires authentication)"""
-    logger.info(f"User {token_data['sub']} updating student {student_id}")
-    return await forward_request("student", f"/api/students/{student_id}", "PUT", json=student_data)
-
-@app.delete("/gateway/students/{student_id}")
-async def delete_student(student_id: int, token_data: dict = Depends(verify_token)):
-    """Delete a student through gateway (requires authentication)"""
-    logger.info(f"User {token_data['sub']} deleting student {student_id}")
-    return await forward_request("student", f"/api/students/{student_id}", "DELETE")
-
-# Course Service Routes (Protected)
-@app.get("/gateway/courses")
-async def get_all_courses(token_data: dict = Depends(verify_token)):
-    """Get all courses through gateway (requires authentication)"""
-    logger.info(f"User {token_data['sub']} accessing courses list")
-    return await forward_request("course", "/api/courses", "GET")
-
-@app.get("/gateway/courses/{course_id}")
-async def get_course(course_id: int, token_data: dict = Depends(verify_token)):
-    """Get a course by ID through gateway (requires authentication)"""
-    logger.info(f"User {token_data['sub']} accessing course {course_id}")
-    return await forward_request("course", f"/api/courses/{course_id}", "GET")
-
-@app.post("/gateway/courses")
-async def create_course(course_data: dict, token_data: dict = Depends(verify_token)):
-    """Create a new course through gateway (requires authentication)"""
-    logger.info(f"User {token_data['sub']} creating new course")
-    return await forward_request("course", "/api/courses", "POST", json=course_data)
-
-@app.put("/gateway/courses/{course_id}")
-async def update_course(course_id: int, course_data: dict, token_data: dict = Depends(verify_token)):
-    """Update a course through gateway (requires authentication)"""
-    logger.info(f"User {token_data['sub']} updating course {course_id}")
-    return await forward_request("course", f"/api/courses/{course_id}", "PUT", json=course_data)
-
-@app.delete("/gateway/courses/{course_id}")
-async def delete_course(course_id: int, token_data: dict = Depends(verify_token)):
-    """Delete a course through gateway (requires authentication)"""
-    logger.info(f"User {token_data['sub']} deleting course {course_id}")
-    return await forward_request("course", f"/api/courses/{course_id}", "DELETE")
\ No newline at end of file
+register_proxy_routes(router)
+app.include_router(router)